@@ -2,32 +2,151 @@
 # This is the main application file.
 # It contains the Dash layout and all the business logic for the casino.
 
+import atexit
+import functools
+import itertools
+import json
+import logging
 import os
+import queue
 import random
+import secrets
+import threading
 import time
+from collections import namedtuple
+from contextlib import contextmanager
 
 import dash
 import dash_bootstrap_components as dbc
-import psycopg2
-import psycopg2.extras
-from dash import dcc, html, Input, no_update, Output, State
+from dash import ClientsideFunction, dcc, html, Input, no_update, Output, State
+from flask_caching import Cache
+from psycopg.conninfo import make_conninfo
+from psycopg.errors import UniqueViolation
+from psycopg.rows import class_row, dict_row
+from psycopg_pool import ConnectionPool, PoolTimeout
+
+# Surfaces the pool's own warnings, e.g. each failed connection attempt while
+# the database is still starting up.
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s"
+)
+logger = logging.getLogger(__name__)
 
 # --- Database Configuration ---
-# It's good practice to retry the connection to give the DB container time to start.
-time.sleep(5)  # A simple delay to wait for the DB to initialize.
-try:
-    conn = psycopg2.connect(
+# The pool keeps between min_size and max_size connections open, replaces ones
+# that come back broken, and waits up to `timeout` seconds for a free connection
+# instead of failing outright. Connections aren't health-checked on checkout,
+# which would cost every callback an extra round-trip; recycling idle and old
+# connections keeps stale ones from being handed out instead.
+POOL = ConnectionPool(
+    conninfo=make_conninfo(
         dbname="casino_db",
         user="casino_user",
         password="casino_password",
-        host="localhost",  # Use 'db' if running this app in a docker container in the same network
-        port="5432",
-    )
-except psycopg2.OperationalError as e:
-    print(f"Could not connect to database: {e}")
-    # In a real app, you'd have more robust retry logic.
+        host="localhost",  # Use 'pgbouncer' if running this app in a docker container in the same network
+        port="6432",  # PgBouncer; Postgres itself listens on 5432
+    ),
+    min_size=2,
+    max_size=8,
+    timeout=10,
+    # Server-side prepare any statement as soon as it repeats on a connection, so
+    # the hot OLTP queries below skip parse/plan on every call after the first.
+    kwargs={"row_factory": dict_row, "prepare_threshold": 1},
+    max_idle=300,
+    max_lifetime=1800,
+    open=False,
+)
+try:
+    # Returns as soon as the DB accepts connections; while it doesn't, the pool
+    # retries with exponential backoff for up to a minute before we give up.
+    POOL.open(wait=True, timeout=60)
+except PoolTimeout as e:
+    logger.error("Could not connect to database: %s", e)
     exit()
 
+atexit.register(POOL.close)
+
+
+@contextmanager
+def db_cursor(row_factory=None):
+    """Yields a cursor on a connection checked out of the pool.
+
+    The transaction commits when the block exits normally and rolls back if it
+    raises; either way the connection is returned to the pool.
+    """
+    with POOL.connection() as conn, conn.cursor(row_factory=row_factory) as cur:
+        yield cur
+
+
+# --- Write-Behind Audit Log ---
+# Audit rows nobody waits on (e.g. the slot spin history) are queued by the
+# callbacks and inserted in batches by a background thread on its own pooled
+# connection, so they don't add to callback latency.
+AUDIT_BATCH_SIZE = 100
+AUDIT_FLUSH_INTERVAL = 0.2  # Seconds to wait for a batch to fill up
+_audit_queue = queue.Queue()
+
+
+def queue_audit_write(sql, params):
+    """Queues a statement to be executed by the background audit writer."""
+    _audit_queue.put((sql, params))
+
+
+def _audit_writer():
+    """Writes queued audit statements in batches until it's handed None."""
+    running = True
+    while running:
+        batch = [_audit_queue.get()]
+        deadline = time.monotonic() + AUDIT_FLUSH_INTERVAL
+        while len(batch) < AUDIT_BATCH_SIZE:
+            try:
+                batch.append(
+                    _audit_queue.get(timeout=max(deadline - time.monotonic(), 0))
+                )
+            except queue.Empty:
+                break
+        if None in batch:
+            running = False
+            batch = [item for item in batch if item is not None]
+
+        # Each statement's rows go out as a single pipelined executemany
+        grouped = {}
+        for sql, params in batch:
+            grouped.setdefault(sql, []).append(params)
+        if not grouped:
+            continue
+        try:
+            with db_cursor() as cur:
+                for sql, params_seq in grouped.items():
+                    cur.executemany(sql, params_seq)
+        except Exception:
+            logger.exception("Could not write audit batch, retrying row by row")
+            _write_audit_rows(batch)
+
+
+def _write_audit_rows(batch):
+    """Writes each queued statement in its own transaction.
+
+    Used after a batch fails, so one bad row only loses itself.
+    """
+    for sql, params in batch:
+        try:
+            with db_cursor() as cur:
+                cur.execute(sql, params)
+        except Exception:
+            logger.exception("Dropped audit write %s with %r", sql, params)
+
+
+def _stop_audit_writer():
+    """Flushes whatever is still queued; runs before the pool is closed."""
+    _audit_queue.put(None)
+    _audit_thread.join(timeout=5)
+
+
+_audit_thread = threading.Thread(target=_audit_writer, name="audit-writer", daemon=True)
+_audit_thread.start()
+atexit.register(_stop_audit_writer)
+
 # --- Dash App Initialization ---
 app = dash.Dash(
     __name__,
@@ -35,57 +154,93 @@ app = dash.Dash(
     suppress_callback_exceptions=True,
 )
 app.title = "Dash Casino"
+# WSGI entry point for production servers, e.g. `gunicorn -w 2 --threads 8 app:server`.
+server = app.server
+
+# Server-side cache for near-static data. SimpleCache is per process; set
+# CACHE_TYPE=RedisCache and CACHE_REDIS_URL to share it between workers, which
+# also makes clear_menu_cache() take effect everywhere at once.
+cache = Cache(
+    server,
+    config={
+        "CACHE_TYPE": os.environ.get("CACHE_TYPE", "SimpleCache"),
+        "CACHE_REDIS_URL": os.environ.get("CACHE_REDIS_URL", ""),
+    },
+)
 
 
 # --- Helper Functions ---
-def get_user(user_id):
-    """Fetches user data from the database."""
-    with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-        cur.execute("SELECT * FROM users WHERE id = %s;", (user_id,))
-        return cur.fetchone()
-
+def get_user_tokens(cur, user_id):
+    """Reads a user's token balance inside the caller's transaction."""
+    cur.execute("SELECT tokens FROM users WHERE id = %s;", (user_id,))
+    return cur.fetchone()["tokens"]
 
-def get_user_by_email_username(email, username):
-    """Fetches a user by their email and username."""
-    with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-        cur.execute(
-            "SELECT * FROM users WHERE email = %s AND username = %s;", (email, username)
-        )
-        return cur.fetchone()
 
+def get_or_create_user(email, username):
+    """Fetches a user by email and username, creating them if they don't exist.
 
-def create_user(email, username):
-    """Creates a new user and returns their data."""
-    with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-        cur.execute(
-            "INSERT INTO users (email, username) VALUES (%s, %s) RETURNING *;",
+    The returned row's "inserted" flag is True when the user was just created.
+    """
+    with POOL.connection() as conn:
+        return conn.execute(
+            """
+            INSERT INTO users (email, username) VALUES (%s, %s)
+            ON CONFLICT (email, username) DO UPDATE SET username = EXCLUDED.username
+            RETURNING id, email, username, tokens, (xmax = 0) AS inserted;
+            """,
             (email, username),
-        )
-        conn.commit()
-        return cur.fetchone()
+        ).fetchone()
 
 
-def get_user_cards(user_id):
-    """Fetches all credit cards for a given user."""
-    with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-        cur.execute(
-            "SELECT id, card_number FROM credit_cards WHERE user_id = %s;", (user_id,)
-        )
-        return cur.fetchall()
+def get_user_wallet(user_id):
+    """Fetches a user's token balance and all their credit cards.
+
+    Returns the "tokens" balance and parallel "ids" and "last4s" card lists,
+    aggregated by Postgres in a single row.
+    """
+    with POOL.connection() as conn:
+        return conn.execute(
+            """
+            SELECT (SELECT tokens FROM users WHERE id = %s) AS tokens,
+                   COALESCE(array_agg(id ORDER BY id), '{}') AS ids,
+                   COALESCE(array_agg(last4 ORDER BY id), '{}') AS last4s
+            FROM credit_cards WHERE user_id = %s;
+            """,
+            (user_id, user_id),
+        ).fetchone()
+
+
+# Menu rows are immutable so the cached menu can be shared between callbacks.
+MenuItem = namedtuple("MenuItem", ["id", "name", "description", "price"])
+
+# Cached menus expire after this many seconds, which bounds how stale a
+# process-local cache in another worker can get.
+MENU_CACHE_TTL = 300
 
 
+@cache.memoize(timeout=MENU_CACHE_TTL)
 def get_food_menu():
-    """Fetches the entire food menu."""
-    with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-        cur.execute("SELECT * FROM food_menu ORDER BY price;")
-        return cur.fetchall()
+    """Returns the food menu, only querying the database after a change or expiry."""
+    with db_cursor(row_factory=class_row(MenuItem)) as cur:
+        cur.execute("SELECT id, name, description, price FROM food_menu ORDER BY price;")
+        return tuple(cur.fetchall())
+
+
+def clear_menu_cache():
+    """Invalidates the cached food menu. Call after any write to food_menu."""
+    cache.delete_memoized(get_food_menu)
 
 
 # --- App Layout ---
 app.layout = html.Div(
     [
-        # Store for user session data (user_id)
+        # Store for user session data ({"id", "username"})
         dcc.Store(id="user-session", storage_type="local"),
+        # Last token balance shown to the user, so reloads render without waiting
+        # on a DB read; load_user_wallet replaces it with the stored balance
+        dcc.Store(id="user-balance", storage_type="local"),
+        # Cards on file for the logged-in user, loaded once per login
+        dcc.Store(id="user-cards", storage_type="memory"),
         # Header
         html.Div(
             className="text-center p-4 bg-primary text-white",
@@ -112,43 +267,59 @@ app.layout = html.Div(
 )
 
 # --- Content Layouts ---
+# Layouts that don't depend on the user are built once at import. Dash only
+# serializes them, so every render can return the same component tree.
+LOGIN_LAYOUT = dbc.Row(
+    dbc.Col(
+        dbc.Card(
+            [
+                dbc.CardHeader(html.H4("User Login / Sign Up")),
+                dbc.CardBody(
+                    [
+                        dbc.Input(
+                            id="login-email",
+                            placeholder="Enter your email...",
+                            type="email",
+                            className="mb-3",
+                        ),
+                        dbc.Input(
+                            id="login-username",
+                            placeholder="Enter your username...",
+                            type="text",
+                            className="mb-3",
+                        ),
+                        dbc.Button(
+                            "Login / Register",
+                            id="login-button",
+                            color="success",
+                            className="w-100",
+                        ),
+                    ]
+                ),
+            ]
+        ),
+        width={"size": 6, "offset": 3},
+    ),
+    className="mt-5",
+)
 
 
 def create_login_layout():
     """Returns the layout for the login screen."""
-    return dbc.Row(
-        dbc.Col(
-            dbc.Card(
-                [
-                    dbc.CardHeader(html.H4("User Login / Sign Up")),
-                    dbc.CardBody(
-                        [
-                            dbc.Input(
-                                id="login-email",
-                                placeholder="Enter your email...",
-                                type="email",
-                                className="mb-3",
-                            ),
-                            dbc.Input(
-                                id="login-username",
-                                placeholder="Enter your username...",
-                                type="text",
-                                className="mb-3",
-                            ),
-                            dbc.Button(
-                                "Login / Register",
-                                id="login-button",
-                                color="success",
-                                className="w-100",
-                            ),
-                        ]
-                    ),
-                ]
-            ),
-            width={"size": 6, "offset": 3},
-        ),
-        className="mt-5",
-    )
+    return LOGIN_LAYOUT
+
+
+APP_TABS = dbc.Tabs(
+    id="app-tabs",
+    active_tab="tab-slots",
+    children=[
+        dbc.Tab(label="Slots", tab_id="tab-slots"),
+        dbc.Tab(label="Blackjack", tab_id="tab-blackjack"),
+        dbc.Tab(label="Wallet", tab_id="tab-wallet"),
+        dbc.Tab(label="Food Station", tab_id="tab-food"),
+        dbc.Tab(label="History", tab_id="history-tab"),
+    ],
+)
 
 
 def create_main_layout(user_data):
@@ -179,37 +350,51 @@ def create_main_layout(user_data):
                 ]
             ),
             html.Hr(),
-            dbc.Tabs(
-                id="app-tabs",
-                active_tab="tab-slots",
-                children=[
-                    dbc.Tab(label="Slots", tab_id="tab-slots"),
-                    dbc.Tab(label="Blackjack", tab_id="tab-blackjack"),
-                    dbc.Tab(label="Wallet", tab_id="tab-wallet"),
-                    dbc.Tab(label="Food Station", tab_id="tab-food"),
-                    dbc.Tab(label="History", tab_id="history-tab"),
-                ],
-            ),
+            APP_TABS,
             html.Div(id="tab-content", className="p-4"),
         ]
     )
 
 
+# --- Notifications ---
+def make_toast(message, header, icon="success", duration=4000):
+    """Builds a notification toast for the toast container."""
+    return dbc.Toast(message, header=header, icon=icon, duration=duration)
+
+
+success_toast = functools.partial(make_toast, icon="success")
+error_toast = functools.partial(make_toast, icon="danger")
+warning_toast = functools.partial(make_toast, icon="warning")
+
+
 # --- Callbacks ---
 
 
-@app.callback(Output("main-content", "children"), Input("user-session", "data"))
-def render_main_content(user_id):
+@app.callback(
+    Output("main-content", "children"),
+    Input("user-session", "data"),
+    State("user-balance", "data"),
+)
+def render_main_content(session, tokens):
     """Renders the main content based on whether the user is logged in."""
-    if user_id:
-        user_data = get_user(user_id)
-        if user_data:
-            return create_main_layout(user_data)
+    # Older sessions stored a bare user id; those users just log in again
+    if isinstance(session, dict):
+        return create_main_layout({**session, "tokens": tokens})
     return create_login_layout()
 
 
+# Keep user-balance in step with every callback that updates the token display
+app.clientside_callback(
+    ClientsideFunction(namespace="session", function_name="mirror_balance"),
+    Output("user-balance", "data"),
+    Input("user-tokens-display", "children"),
+    prevent_initial_call=True,
+)
+
+
 @app.callback(
     Output("user-session", "data", allow_duplicate=True),
+    Output("user-balance", "data", allow_duplicate=True),
     Output("notification-toast-container", "children", allow_duplicate=True),
     Input("login-button", "n_clicks"),
     State("login-email", "value"),
@@ -219,29 +404,28 @@ def render_main_content(user_id):
 def handle_login(n_clicks, email, username):
     """Handles the user login/registration process."""
     if not email or not username:
-        toast = dbc.Toast(
-            "Email and username are required.",
-            header="Login Error",
-            icon="danger",
-            duration=4000,
+        toast = error_toast("Email and username are required.", "Login Error")
+        return no_update, no_update, toast
+
+    try:
+        user = get_or_create_user(email, username)
+    except UniqueViolation:
+        # Emails are unique on their own, so the upsert can't claim an email
+        # that is already registered under a different username
+        toast = error_toast(
+            "That email is registered with a different username.", "Login Error"
         )
-        return no_update, toast
-
-    user = get_user_by_email_username(email, username)
-    if not user:
-        user = create_user(email, username)
-        toast_message = "New user created successfully!"
-        toast_header = "Welcome!"
-        toast_icon = "success"
+        return no_update, no_update, toast
+    if user["inserted"]:
+        toast = success_toast("New user created successfully!", "Welcome!")
     else:
-        toast_message = f"Welcome back, {user['username']}!"
-        toast_header = "Login Successful"
-        toast_icon = "success"
-
-    toast = dbc.Toast(
-        toast_message, header=toast_header, icon=toast_icon, duration=4000
-    )
-    return user["id"], toast
+        toast = success_toast(
+            f"Welcome back, {user['username']}!", "Login Successful"
+        )
+    # The balance is written alongside the session so the main layout,
+    # rendered when the session changes, can show it without a DB read
+    session = {"id": user["id"], "username": user["username"]}
+    return session, user["tokens"], toast
 
 
 @app.callback(
@@ -260,13 +444,15 @@ def handle_logout(n_clicks):
     Output("tab-content", "children"),
     Input("app-tabs", "active_tab"),
     State("user-session", "data"),
+    State("user-cards", "data"),
 )
-def render_tab_content(active_tab, user_id):
+def render_tab_content(active_tab, session, cards):
     """Renders the content for the selected tab."""
-    if not user_id:
+    if not session:
         return "Please log in to see content."
+    user_id = session["id"]
     if active_tab == "tab-wallet":
-        return render_wallet_tab(user_id)
+        return render_wallet_tab(cards or {"ids": [], "last4s": []})
     elif active_tab == "tab-slots":
         return render_slots_tab(user_id)
     elif active_tab == "tab-blackjack":
@@ -278,18 +464,53 @@ def render_tab_content(active_tab, user_id):
     return html.P("This is the content of the selected tab.")
 
 
+# Runs whenever the main layout mounts, i.e. on login and on every reload
+@app.callback(
+    Output("user-cards", "data"),
+    Output("user-tokens-display", "children", allow_duplicate=True),
+    Output("user-session", "data", allow_duplicate=True),
+    Input("user-tokens-display", "id"),
+    State("user-session", "data"),
+    prevent_initial_call="initial_duplicate",
+)
+def load_user_wallet(_, session):
+    """Refreshes the balance from the database and caches the user's cards.
+
+    The balance shown from user-balance only tracks changes made in this
+    browser, so it is replaced with the stored one. The cards are cached so tab
+    switches don't go back to the database. A session whose user no longer
+    exists is cleared, which sends the browser back to the login page.
+    """
+    if not isinstance(session, dict):
+        return None, no_update, no_update
+    wallet = get_user_wallet(session["id"])
+    if wallet["tokens"] is None:
+        return None, no_update, None
+    cards = {"ids": wallet["ids"], "last4s": wallet["last4s"]}
+    return cards, wallet["tokens"], no_update
+
+
 # --- Wallet Tab ---
-def render_wallet_tab(user_id):
-    cards = get_user_cards(user_id)
-    card_list = (
-        [
-            dbc.ListGroupItem(f"**** **** **** {card['card_number'][-4:]}")
-            for card in cards
-        ]
-        if cards
+def build_card_list(cards):
+    return (
+        [dbc.ListGroupItem(f"**** **** **** {last4}") for last4 in cards["last4s"]]
+        if cards["last4s"]
         else [dbc.ListGroupItem("No cards on file.")]
     )
 
+
+def build_card_options(cards):
+    return [
+        {"label": f"Card ending in {last4}", "value": card_id}
+        for card_id, last4 in zip(cards["ids"], cards["last4s"])
+    ]
+
+
+def render_wallet_tab(cards):
+    card_list = build_card_list(cards)
+    # Shared by the purchase, convert and transaction-history card selects
+    card_options = build_card_options(cards)
+
     return html.Div(
         [
             dbc.Row(
@@ -344,13 +565,7 @@ def render_wallet_tab(user_id):
                             html.P("Select a credit card and an amount to purchase."),
                             dbc.Select(
                                 id="card-select-dropdown",
-                                options=[
-                                    {
-                                        "label": f"Card ending in {c['card_number'][-4:]}",
-                                        "value": c["id"],
-                                    }
-                                    for c in cards
-                                ],
+                                options=card_options,
                                 placeholder="Select a card...",
                             ),
                             html.Div(
@@ -388,10 +603,7 @@ def render_wallet_tab(user_id):
                             ),
                             dbc.Select(
                                 id="convert-card-select-dropdown",
-                                options=[
-                                    {"label": f"Card ending in {c['card_number'][-4:]}", "value": c["id"]}
-                                    for c in cards
-                                ],
+                                options=card_options,
                                 placeholder="Select a card to convert tokens to cash",
                                 className="mb-3",
                             ),
@@ -420,10 +632,7 @@ def render_wallet_tab(user_id):
                         [
                             dbc.Select(
                                 id="transaction-card-select",
-                                options=[
-                                    {"label": f"Card ending in {c['card_number'][-4:]}", "value": c["id"]}
-                                    for c in cards
-                                ],
+                                options=card_options,
                                 placeholder="Select a card to view transactions",
                             ),
                             html.Div(id="transactions-list-container", className="mt-3"),
@@ -440,60 +649,40 @@ def render_wallet_tab(user_id):
     Output("card-list-group", "children"),
     Output("card-select-dropdown", "options"),
     Output("transaction-card-select", "options"),
+    Output("user-cards", "data", allow_duplicate=True),
     Output("notification-toast-container", "children", allow_duplicate=True),
     Input("add-card-button", "n_clicks"),
     State("user-session", "data"),
     State("new-card-number", "value"),
+    State("user-cards", "data"),
     prevent_initial_call=True,
 )
-def add_credit_card(n_clicks, user_id, card_number):
+def add_credit_card(n_clicks, session, card_number, cards):
     """Adds a new credit card for the user."""
+    user_id = session["id"]
     if not card_number:
-        cards = get_user_cards(user_id)
-        card_list = [
-            dbc.ListGroupItem(f"**** **** **** {card['card_number'][-4:]}")
-            for card in cards
-        ]
-        card_options = [
-            {"label": f"Card ending in {c['card_number'][-4:]}", "value": c["id"]}
-            for c in cards
-        ]
-
-        return card_list, card_options, card_options, no_update
+        return no_update, no_update, no_update, no_update, no_update
 
     if not card_number.isdigit() or len(card_number) != 16:
-        toast = dbc.Toast(
-            "Please enter a valid 16-digit card number.",
-            header="Error",
-            icon="danger",
-            duration=4000,
-        )
-        return no_update, no_update, no_update, toast
+        toast = error_toast("Please enter a valid 16-digit card number.", "Error")
+        return no_update, no_update, no_update, no_update, toast
 
-    with conn.cursor() as cur:
+    # Only the last four digits are stored
+    last4 = card_number[-4:]
+    with db_cursor() as cur:
         cur.execute(
-            "INSERT INTO credit_cards (user_id, card_number) VALUES (%s, %s);",
-            (user_id, card_number),
+            "INSERT INTO credit_cards (user_id, last4) VALUES (%s, %s) RETURNING id;",
+            (user_id, last4),
         )
-        conn.commit()
+        card_id = cur.fetchone()["id"]
 
-    cards = get_user_cards(user_id)
-    card_list = [
-        dbc.ListGroupItem(f"**** **** **** {card['card_number'][-4:]}")
-        for card in cards
-    ]
-    card_options = [
-        {"label": f"Card ending in {c['card_number'][-4:]}", "value": c["id"]}
-        for c in cards
-    ]
-    toast = dbc.Toast(
-        "Credit card added successfully!",
-        header="Success",
-        icon="success",
-        duration=4000,
-    )
+    # Append the new card to the cached list rather than re-fetching it
+    cards = cards or {"ids": [], "last4s": []}
+    cards = {"ids": cards["ids"] + [card_id], "last4s": cards["last4s"] + [last4]}
+    card_options = build_card_options(cards)
+    toast = success_toast("Credit card added successfully!", "Success")
 
-    return card_list, card_options, card_options, toast
+    return build_card_list(cards), card_options, card_options, cards, toast
 
 
 @app.callback(
@@ -504,35 +693,36 @@ def add_credit_card(n_clicks, user_id, card_number):
     State("card-select-dropdown", "value"),
     prevent_initial_call=True,
 )
-def buy_tokens(n_clicks, user_id, card_id):
+def buy_tokens(n_clicks, session, card_id):
     """Handles token purchase logic."""
+    user_id = session["id"]
     ctx = dash.callback_context
     if not ctx.triggered or not any(n_clicks):
         return no_update, no_update
 
     if not card_id:
-        toast = dbc.Toast(
-            "Please add a credit card first.",
-            header="Error",
-            icon="warning",
-            duration=4000,
-        )
+        toast = warning_toast("Please add a credit card first.", "Error")
         return no_update, toast
 
-    button_id = ctx.triggered[0]["prop_id"].split(".")[0]
-    amount_to_buy = eval(button_id)["amount"]
+    # Pattern-matching ids arrive already parsed as a dict
+    amount_to_buy = ctx.triggered_id["amount"]
 
-    with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-        # Add tokens to user
-        cur.execute(
-            "UPDATE users SET tokens = tokens + %s WHERE id = %s RETURNING tokens;",
-            (amount_to_buy, user_id),
-        )
-        new_balance = cur.fetchone()["tokens"]
-        # Log transaction
+    with db_cursor() as cur:
+        # Add tokens to user and log the transaction in a single round-trip
         cur.execute(
-            "INSERT INTO transactions (user_id, card_id, transaction_type, amount, description) VALUES (%s, %s, %s, %s, %s);",
+            """
+            WITH upd AS (
+                UPDATE users SET tokens = tokens + %s WHERE id = %s RETURNING tokens
+            ), txn AS (
+                INSERT INTO transactions
+                (user_id, card_id, transaction_type, amount, description)
+                VALUES (%s, %s, %s, %s, %s)
+            )
+            SELECT tokens FROM upd;
+            """,
             (
+                amount_to_buy,
+                user_id,
                 user_id,
                 card_id,
                 "purchase_tokens",
@@ -540,13 +730,10 @@ def buy_tokens(n_clicks, user_id, card_id):
                 f"Purchased {amount_to_buy} tokens.",
             ),
         )
-        conn.commit()
+        new_balance = cur.fetchone()["tokens"]
 
-    toast = dbc.Toast(
-        f"Successfully purchased {amount_to_buy} tokens!",
-        header="Purchase Complete",
-        icon="success",
-        duration=4000,
+    toast = success_toast(
+        f"Successfully purchased {amount_to_buy} tokens!", "Purchase Complete"
     )
     return new_balance, toast
 
@@ -561,59 +748,53 @@ def buy_tokens(n_clicks, user_id, card_id):
     State("user-session", "data"),
     prevent_initial_call=True,
 )
-def convert_tokens(n_clicks, token_amount, card_id, user_id):
+def convert_tokens(n_clicks, token_amount, card_id, session):
+    user_id = session["id"]
     if not token_amount or token_amount <= 0:
-        toast = dbc.Toast(
-            "Please enter a valid token amount.",
-            header="Invalid Input",
-            icon="danger",
-            duration=4000,
-        )
+        toast = error_toast("Please enter a valid token amount.", "Invalid Input")
         return no_update, toast
 
     if not card_id:
-        toast = dbc.Toast(
-            "Please select a card to receive the cash.",
-            header="No Card Selected",
-            icon="warning",
-            duration=4000,
+        toast = warning_toast(
+            "Please select a card to receive the cash.", "No Card Selected"
         )
         return no_update, toast
 
-    with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-        cur.execute("SELECT tokens FROM users WHERE id = %s;", (user_id,))
-        user = cur.fetchone()
-
-        if user["tokens"] < token_amount:
-            toast = dbc.Toast(
-                "You don't have enough tokens.",
-                header="Insufficient Tokens",
-                icon="warning",
-                duration=4000,
-            )
-            return no_update, toast
-
-        cur.execute(
-            "UPDATE users SET tokens = tokens - %s WHERE id = %s RETURNING tokens;",
-            (token_amount, user_id),
-        )
-        new_balance = cur.fetchone()["tokens"]
+    with db_cursor() as cur:
+        # Debit and log the conversion in a single round-trip. The balance check
+        # is part of the UPDATE, so no row comes back if the user can't afford it.
         cur.execute(
             """
-            INSERT INTO transactions
-            (user_id, card_id, transaction_type, amount, description)
-            VALUES (%s, %s, %s, %s, %s);
+            WITH upd AS (
+                UPDATE users SET tokens = tokens - %s
+                WHERE id = %s AND tokens >= %s
+                RETURNING tokens
+            ), txn AS (
+                INSERT INTO transactions
+                (user_id, card_id, transaction_type, amount, description)
+                SELECT %s, %s, %s, %s, %s FROM upd
+            )
+            SELECT tokens FROM upd;
             """,
-            (user_id, card_id, "convert_to_cash", -token_amount, f"Converted {token_amount} tokens to cash."),
+            (
+                token_amount,
+                user_id,
+                token_amount,
+                user_id,
+                card_id,
+                "convert_to_cash",
+                -token_amount,
+                f"Converted {token_amount} tokens to cash.",
+            ),
         )
-        conn.commit()
+        row = cur.fetchone()
 
-    toast = dbc.Toast(
-        f"Converted {token_amount} tokens into cash!",
-        header="Success",
-        icon="success",
-        duration=4000,
-    )
+    if row is None:
+        toast = warning_toast("You don't have enough tokens.", "Insufficient Tokens")
+        return no_update, toast
+    new_balance = row["tokens"]
+
+    toast = success_toast(f"Converted {token_amount} tokens into cash!", "Success")
     return new_balance, toast
 
 # callback for viewing transactions
@@ -623,11 +804,12 @@ def convert_tokens(n_clicks, token_amount, card_id, user_id):
     State("user-session", "data"),
     prevent_initial_call=True,
 )
-def show_card_transactions(card_id, user_id):
+def show_card_transactions(card_id, session):
+    user_id = session["id"]
     if not card_id:
         return "Please select a card to view transactions."
 
-    with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
+    with db_cursor() as cur:
         # Multi-table query joining credit_cards and transactions on card_id
         cur.execute(
             """
@@ -662,76 +844,85 @@ def show_card_transactions(card_id, user_id):
 
 
 # --- Slots Tab ---
-def render_slots_tab(user_id):
-    """Renders the layout for the slots game."""
-    return dbc.Card(
-        dbc.CardBody(
-            [
-                dcc.Store(id="card-select-dropdown", storage_type="local"),
-                html.H4("Slot Machine", className="card-title text-center"),
-                html.P("Place your bet and pull the lever!", className="text-center"),
-                # Reels Display
-                dbc.Row(
-                    [
-                        dbc.Col(
-                            html.Div(
-                                "?",
-                                id="reel-1",
-                                className="fs-1 text-center p-4 border rounded bg-light text-dark",
-                            ),
-                            width=4,
-                        ),
-                        dbc.Col(
-                            html.Div(
-                                "?",
-                                id="reel-2",
-                                className="fs-1 text-center p-4 border rounded bg-light text-dark",
-                            ),
-                            width=4,
+# Reel symbols with their cumulative draw weights (cherry is most common, 7 is
+# rarest) and payout multipliers, built once rather than on every spin.
+SLOT_SYMBOLS = ("🍒", "🍋", "🍊", "🔔", "BAR", "7️⃣")
+SLOT_CUM_WEIGHTS = tuple(itertools.accumulate([0.3, 0.25, 0.2, 0.15, 0.08, 0.02]))
+SLOT_PAYOUTS = {"🍒": 2, "🍋": 3, "🍊": 5, "🔔": 10, "BAR": 25, "7️⃣": 100}
+
+
+SLOTS_TAB_LAYOUT = dbc.Card(
+    dbc.CardBody(
+        [
+            dcc.Store(id="card-select-dropdown", storage_type="local"),
+            # Outcome of the latest spin, rendered into the reels in the browser
+            dcc.Store(id="slots-spin-result"),
+            html.H4("Slot Machine", className="card-title text-center"),
+            html.P("Place your bet and pull the lever!", className="text-center"),
+            # Reels Display
+            dbc.Row(
+                [
+                    dbc.Col(
+                        html.Div(
+                            "?",
+                            id="reel-1",
+                            className="fs-1 text-center p-4 border rounded bg-light text-dark",
                         ),
-                        dbc.Col(
-                            html.Div(
-                                "?",
-                                id="reel-3",
-                                className="fs-1 text-center p-4 border rounded bg-light text-dark",
-                            ),
-                            width=4,
+                        width=4,
+                    ),
+                    dbc.Col(
+                        html.Div(
+                            "?",
+                            id="reel-2",
+                            className="fs-1 text-center p-4 border rounded bg-light text-dark",
                         ),
-                    ],
-                    className="mb-4",
-                ),
-                # Bet Amount
-                dbc.InputGroup(
-                    [
-                        dbc.InputGroupText("Bet Amount"),
-                        dbc.Input(
-                            id="bet-amount", type="number", value=10, min=1, step=1
+                        width=4,
+                    ),
+                    dbc.Col(
+                        html.Div(
+                            "?",
+                            id="reel-3",
+                            className="fs-1 text-center p-4 border rounded bg-light text-dark",
                         ),
-                    ],
-                    className="mb-3",
-                ),
-                # Spin Button
-                dbc.Button(
-                    "Spin!",
-                    id="spin-button",
-                    color="warning",
-                    size="lg",
-                    className="w-100",
-                ),
-                # Result Message
-                html.Div(
-                    id="spin-result-message", className="mt-3 text-center fs-4 fw-bold"
-                ),
-            ]
-        )
+                        width=4,
+                    ),
+                ],
+                className="mb-4",
+            ),
+            # Bet Amount
+            dbc.InputGroup(
+                [
+                    dbc.InputGroupText("Bet Amount"),
+                    dbc.Input(
+                        id="bet-amount", type="number", value=10, min=1, step=1
+                    ),
+                ],
+                className="mb-3",
+            ),
+            # Spin Button
+            dbc.Button(
+                "Spin!",
+                id="spin-button",
+                color="warning",
+                size="lg",
+                className="w-100",
+            ),
+            # Result Message
+            html.Div(
+                id="spin-result-message", className="mt-3 text-center fs-4 fw-bold"
+            ),
+        ]
     )
+)
+
+
+def render_slots_tab(user_id):
+    """Renders the layout for the slots game."""
+    return SLOTS_TAB_LAYOUT
 
 
 @app.callback(
-    Output("reel-1", "children"),
-    Output("reel-2", "children"),
-    Output("reel-3", "children"),
-    Output("spin-result-message", "children"),
+    Output("slots-spin-result", "data"),
     Output("user-tokens-display", "children"),
     Output("notification-toast-container", "children", allow_duplicate=True),
     Input("spin-button", "n_clicks"),
@@ -739,36 +930,22 @@ def render_slots_tab(user_id):
     State("bet-amount", "value"),
     prevent_initial_call=True,
 )
-def play_slots(n_clicks, user_id, bet_amount):
-    """Handles the logic for a single spin of the slot machine."""
+def play_slots(n_clicks, session, bet_amount):
+    """Handles the logic for a single spin of the slot machine.
+
+    The outcome is decided here, never in the browser; drawing it onto the
+    reels is left to the clientside render_spin callback.
+    """
+    user_id = session["id"]
     if n_clicks is None:
-        return no_update, no_update, no_update, no_update, no_update, no_update
+        return no_update, no_update, no_update
 
     if not bet_amount or bet_amount <= 0:
-        toast = dbc.Toast(
-            "Bet amount must be greater than 0.",
-            header="Invalid Bet",
-            icon="danger",
-            duration=4000,
-        )
-        return no_update, no_update, no_update, no_update, no_update, toast
-
-    user = get_user(user_id)
-    if user["tokens"] < bet_amount:
-        toast = dbc.Toast(
-            "Not enough tokens for this bet.",
-            header="Insufficient Funds",
-            icon="warning",
-            duration=4000,
-        )
-        return no_update, no_update, no_update, no_update, no_update, toast
+        toast = error_toast("Bet amount must be greater than 0.", "Invalid Bet")
+        return no_update, no_update, toast
 
     # --- Game Logic ---
-    symbols = ["🍒", "🍋", "🍊", "🔔", "BAR", "7️⃣"]
-    weights = [0.3, 0.25, 0.2, 0.15, 0.08, 0.02]  # Cherry is most common, 7 is rarest
-    payouts = {"🍒": 2, "🍋": 3, "🍊": 5, "🔔": 10, "BAR": 25, "7️⃣": 100}
-
-    reels = [random.choices(symbols, weights=weights, k=1)[0] for _ in range(3)]
+    reels = random.choices(SLOT_SYMBOLS, cum_weights=SLOT_CUM_WEIGHTS, k=3)
     is_win = reels[0] == reels[1] == reels[2]
     payout_amount = 0
     token_change = -bet_amount
@@ -776,89 +953,164 @@ def play_slots(n_clicks, user_id, bet_amount):
 
     if is_win:
         winning_symbol = reels[0]
-        payout_multiplier = payouts[winning_symbol]
+        payout_multiplier = SLOT_PAYOUTS[winning_symbol]
         payout_amount = bet_amount * payout_multiplier
         token_change += payout_amount
         result_message = f"JACKPOT! You won {payout_amount} tokens!"
-        result_style = {"color": "gold"}
+        result_color = "gold"
     else:
         result_message = "Better luck next time!"
-        result_style = {"color": "white"}
+        result_color = "white"
 
     # --- Database Update ---
-    with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-        # Update user tokens
-        cur.execute(
-            "UPDATE users SET tokens = tokens + %s WHERE id = %s RETURNING tokens;",
-            (token_change, user_id),
-        )
-        new_balance = cur.fetchone()["tokens"]
-        # Log the spin
+    with db_cursor() as cur:
+        # Settle the spin and log the transaction in a single round-trip. The
+        # balance check is part of the UPDATE, so concurrent spins can't overdraw.
         cur.execute(
-            "INSERT INTO slots_spins (user_id, bet_amount, reels, is_win, payout_amount) VALUES (%s, %s, %s, %s, %s);",
-            (user_id, bet_amount, "-".join(reels), is_win, payout_amount),
-        )
-        # Log into transactions table
-        cur.execute(
-            "INSERT INTO transactions (user_id, transaction_type, amount, description) VALUES (%s, %s, %s, %s);",
+            """
+            WITH upd AS (
+                UPDATE users SET tokens = tokens + %s
+                WHERE id = %s AND tokens >= %s
+                RETURNING tokens
+            ), txn AS (
+                INSERT INTO transactions
+                (user_id, transaction_type, amount, description)
+                SELECT %s, %s, %s, %s FROM upd
+            )
+            SELECT tokens FROM upd;
+            """,
             (
+                token_change,
+                user_id,
+                bet_amount,
                 user_id,
                 "slot_win" if is_win else "slot_loss",
                 token_change,
                 result_message,
             ),
         )
-        conn.commit()
+        row = cur.fetchone()
 
-    return (
-        reels[0],
-        reels[1],
-        reels[2],
-        html.Span(result_message, style=result_style),
-        new_balance,
-        no_update,
+    if row is None:
+        toast = warning_toast("Not enough tokens for this bet.", "Insufficient Funds")
+        return no_update, no_update, toast
+    new_balance = row["tokens"]
+
+    # The spin history isn't needed to answer the player, so it's written behind
+    queue_audit_write(
+        "INSERT INTO slots_spins (user_id, bet_amount, reels, is_win, payout_amount) VALUES (%s, %s, %s, %s, %s);",
+        (user_id, bet_amount, "-".join(reels), is_win, payout_amount),
     )
 
+    spin_result = {"reels": reels, "message": result_message, "color": result_color}
+    return spin_result, new_balance, no_update
+
+
+app.clientside_callback(
+    ClientsideFunction(namespace="slots", function_name="render_spin"),
+    Output("reel-1", "children"),
+    Output("reel-2", "children"),
+    Output("reel-3", "children"),
+    Output("spin-result-message", "children"),
+    Output("spin-result-message", "style"),
+    Input("slots-spin-result", "data"),
+    prevent_initial_call=True,
+)
+
 
 # --- Blackjack Helper Functions ---
+# Cards are ints 0-51: CARD_RANKS[card % 13] of CARD_SUITS[card // 13]. That
+# keeps them small in the game state and the stored hands.
+CARD_SUITS = ("♠", "♥", "♦", "♣")
+CARD_RANKS = ("A", "2", "3", "4", "5", "6", "7", "8", "9", "10", "J", "Q", "K")
+# Aces count as 1 here; calculate_hand_value() upgrades one to 11 when it fits
+CARD_VALUE = bytes(min(card % 13 + 1, 10) for card in range(52))
+CARD_LABELS = tuple(
+    f"{CARD_RANKS[card % 13]}{CARD_SUITS[card // 13]}" for card in range(52)
+)
+DECK = tuple(range(52))
+
+
 def create_deck():
     """Creates a standard 52-card deck."""
-    suits = ["♠", "♥", "♦", "♣"]
-    ranks = ["A", "2", "3", "4", "5", "6", "7", "8", "9", "10", "J", "Q", "K"]
-    return [{"rank": rank, "suit": suit} for suit in suits for rank in ranks]
-
-
-def get_card_value(card, current_score=0):
-    """Returns the value of a card in blackjack."""
-    if card["rank"] in ["J", "Q", "K"]:
-        return 10
-    elif card["rank"] == "A":
-        # Ace is 11 unless it would bust, then it's 1
-        return 11 if current_score + 11 <= 21 else 1
-    else:
-        return int(card["rank"])
+    return list(DECK)
 
 
-def calculate_hand_value(hand):
-    """Calculates the total value of a hand, handling Aces properly."""
-    value = 0
-    aces = 0
-
-    for card in hand:
-        if card["rank"] == "A":
-            aces += 1
-            value += 11
-        elif card["rank"] in ["J", "Q", "K"]:
-            value += 10
-        else:
-            value += int(card["rank"])
+def shuffled_deck(seed):
+    """Returns a deck shuffled deterministically from `seed`.
+
+    Cards are drawn with pop(), so the next card is always the last one.
+    """
+    deck = create_deck()
+    random.Random(seed).shuffle(deck)
+    return deck
+
+
+def remaining_deck(seed, drawn):
+    """Returns what is left of the deck shuffled from `seed` after `drawn` cards."""
+    deck = shuffled_deck(seed)
+    del deck[len(deck) - drawn :]
+    return deck
+
+
+class RoundNotActive(Exception):
+    """Raised when an action targets a round that isn't the user's active one."""
+
+
+# The seed, the number of cards drawn so far and the dealer's hand live in
+# blackjack_rounds and never leave the server, so the browser can neither see
+# the hole card nor see or pick the cards that come next. The player's hands
+# and bets are still taken from the browser's game state.
+def load_round_deck(cur, round_id, user_id):
+    """Rebuilds what is left of a round's deck, locking the round's row.
 
-    # Convert Aces from 11 to 1 if needed
-    while value > 21 and aces > 0:
-        value -= 10
-        aces -= 1
+    Returns the remaining deck and the dealer's hand. The caller records how
+    many cards it drew in its own write to the round.
+    """
+    cur.execute(
+        """
+        SELECT deck_seed, drawn, dealer_hand FROM blackjack_rounds
+        WHERE id = %s AND user_id = %s AND round_status = 'active'
+        FOR UPDATE;
+        """,
+        (round_id, user_id),
+    )
+    row = cur.fetchone()
+    if row is None:
+        raise RoundNotActive(round_id)
+    deck = remaining_deck(row["deck_seed"], row["drawn"])
+    return deck, json.loads(row["dealer_hand"])
+
+
+def draw_round_cards(cur, round_id, user_id, count):
+    """Draws the next `count` cards from a round's deck."""
+    cur.execute(
+        """
+        UPDATE blackjack_rounds SET drawn = drawn + %s
+        WHERE id = %s AND user_id = %s AND round_status = 'active'
+        RETURNING deck_seed, drawn;
+        """,
+        (count, round_id, user_id),
+    )
+    row = cur.fetchone()
+    if row is None:
+        raise RoundNotActive(round_id)
+    deck = remaining_deck(row["deck_seed"], row["drawn"] - count)
+    return [deck.pop() for _ in range(count)]
+
+
+def soft_value(hard_value, has_ace):
+    """Upgrades one Ace from 1 to 11 when that doesn't bust the hand."""
+    # At most one Ace can count as 11 without busting
+    return hard_value + 10 if has_ace and hard_value <= 11 else hard_value
 
-    return value
+
+def calculate_hand_value(hand):
+    """Calculates the total value of a hand, handling Aces properly."""
+    return soft_value(
+        sum(CARD_VALUE[card] for card in hand),
+        any(CARD_VALUE[card] == 1 for card in hand),
+    )
 
 
 def can_split_hand(hand):
@@ -866,15 +1118,26 @@ def can_split_hand(hand):
     if len(hand) != 2:
         return False
 
-    # Get the rank values for comparison
-    rank1 = hand[0]["rank"]
-    rank2 = hand[1]["rank"]
-
     # Treat all 10-value cards as equivalent for splitting
-    value1 = 10 if rank1 in ["10", "J", "Q", "K"] else rank1
-    value2 = 10 if rank2 in ["10", "J", "Q", "K"] else rank2
+    return CARD_VALUE[hand[0]] == CARD_VALUE[hand[1]]
+
+
+def new_hands():
+    """Returns an empty set of player hands.
+
+    Hands are stored column-wise, one list per field indexed by hand, so the
+    game state's JSON doesn't repeat every field name for every hand.
+    """
+    return {"cards": [], "bet": [], "status": [], "doubled": [], "score": []}
 
-    return value1 == value2
+
+def add_hand(hands, cards, bet, score):
+    """Appends a new active hand of `cards` staked with `bet`."""
+    hands["cards"].append(cards)
+    hands["bet"].append(bet)
+    hands["status"].append("active")
+    hands["doubled"].append(False)
+    hands["score"].append(score)
 
 
 def can_double_down(hand):
@@ -884,135 +1147,175 @@ def can_double_down(hand):
 
 def format_card(card):
     """Formats a card for display."""
-    return f"{card['rank']}{card['suit']}"
+    return CARD_LABELS[card]
 
 
+@functools.lru_cache(maxsize=1024)
 def format_hand(hand):
-    """Formats a hand for display."""
-    return " ".join([format_card(card) for card in hand])
+    """Formats a hand, given as a tuple of cards, for display."""
+    return " ".join([CARD_LABELS[card] for card in hand])
 
 
-# --- Blackjack Tab ---
-def render_blackjack_tab(user_id):
-    """Renders the layout for the blackjack game."""
-    return dbc.Card(
-        dbc.CardBody(
-            [
-                dcc.Store(
-                    id="blackjack-game-state",
-                    data={
-                        "deck": [],
-                        "dealer_hand": [],
-                        "hands": [],  # List of player hands (supports multiple for splits)
-                        "current_hand": 0,  # Index of currently active hand
-                        "round_id": None,
-                        "game_active": False,
-                        "dealer_turn": False,
-                        "initial_bet": 0,
-                    },
-                ),
-                html.H4("Blackjack", className="card-title text-center"),
-                html.P(
-                    "Beat the dealer to 21! Split pairs and double down for bigger wins!",
-                    className="text-center",
-                ),
-                # Dealer's Hand
-                dbc.Row(
-                    [
-                        dbc.Col(
-                            [
-                                html.H5("Dealer's Hand", className="text-center"),
-                                html.Div(
-                                    id="dealer-hand-display",
-                                    className="fs-4 text-center p-3 border rounded bg-light text-dark mb-2",
-                                ),
-                                html.Div(
-                                    id="dealer-score-display",
-                                    className="text-center fw-bold",
-                                ),
-                            ],
-                            width=12,
-                        )
-                    ],
-                    className="mb-4",
-                ),
-                # Player's Hands (dynamic, supports multiple for splits)
-                html.Div(id="player-hands-container"),
-                # Bet Amount
-                dbc.InputGroup(
-                    [
-                        dbc.InputGroupText("Bet Amount"),
-                        dbc.Input(
-                            id="blackjack-bet-amount",
-                            type="number",
-                            value=10,
-                            min=1,
-                            step=1,
-                        ),
-                    ],
-                    className="mb-3",
-                ),
-                # Game Controls
-                dbc.Row(
-                    [
-                        dbc.Col(
-                            [
-                                dbc.Button(
-                                    "Deal",
-                                    id="deal-button",
-                                    color="success",
-                                    size="lg",
-                                    className="w-100 mb-2",
-                                ),
-                                dbc.Button(
-                                    "Hit",
-                                    id="hit-button",
-                                    color="warning",
-                                    size="lg",
-                                    className="w-100 mb-2",
-                                    disabled=True,
-                                ),
-                                dbc.Button(
-                                    "Stand",
-                                    id="stand-button",
-                                    color="danger",
-                                    size="lg",
-                                    className="w-100 mb-2",
-                                    disabled=True,
-                                ),
-                                dbc.Button(
-                                    "Double Down",
-                                    id="double-button",
-                                    color="info",
-                                    size="lg",
-                                    className="w-100 mb-2",
-                                    disabled=True,
-                                ),
-                                dbc.Button(
-                                    "Split",
-                                    id="split-button",
-                                    color="primary",
-                                    size="lg",
-                                    className="w-100 mb-2",
-                                    disabled=True,
-                                ),
-                            ],
-                            width=12,
-                        )
-                    ]
-                ),
-                # Game Status
-                html.Div(id="blackjack-status", className="mt-3 text-center fs-5"),
-                # Game Result
-                html.Div(
-                    id="blackjack-result-message",
-                    className="mt-3 text-center fs-4 fw-bold",
-                ),
-            ]
-        )
+@functools.lru_cache(maxsize=512)
+def render_hand(number, cards_text, bet_amount, status, is_doubled, score, is_current):
+    """Builds the display row for one player hand.
+
+    Cached on plain values, so hands that didn't change since the last action
+    reuse their components.
+    """
+    border_class = "border-warning border-3" if is_current else "border"
+    return dbc.Row(
+        [
+            dbc.Col(
+                [
+                    html.H6(
+                        f"Hand {number} {'(Current)' if is_current else ''} - Bet: {bet_amount} {'(Doubled)' if is_doubled else ''}",
+                        className="text-center mb-2",
+                    ),
+                    html.Div(
+                        cards_text,
+                        className=f"fs-5 text-center p-2 rounded bg-light text-dark {border_class}",
+                    ),
+                    html.Div(
+                        f"Score: {score} ({status.title()})",
+                        className="text-center fw-bold mt-1",
+                    ),
+                ],
+                width=12,
+            )
+        ],
+        className="mb-3",
     )
 
 
+# --- Blackjack Tab ---
+BLACKJACK_TAB_LAYOUT = dbc.Card(
+    dbc.CardBody(
+        [
+            dcc.Store(
+                id="blackjack-game-state",
+                data={
+                    "dealer_upcard": None,
+                    "hands": new_hands(),  # Player hands (several after splits)
+                    "current_hand": 0,  # Index of currently active hand
+                    "round_id": None,
+                    "game_active": False,
+                    "dealer_turn": False,
+                    "initial_bet": 0,
+                },
+            ),
+            html.H4("Blackjack", className="card-title text-center"),
+            html.P(
+                "Beat the dealer to 21! Split pairs and double down for bigger wins!",
+                className="text-center",
+            ),
+            # Dealer's Hand
+            dbc.Row(
+                [
+                    dbc.Col(
+                        [
+                            html.H5("Dealer's Hand", className="text-center"),
+                            html.Div(
+                                id="dealer-hand-display",
+                                className="fs-4 text-center p-3 border rounded bg-light text-dark mb-2",
+                            ),
+                            html.Div(
+                                id="dealer-score-display",
+                                className="text-center fw-bold",
+                            ),
+                        ],
+                        width=12,
+                    )
+                ],
+                className="mb-4",
+            ),
+            # Player's Hands (dynamic, supports multiple for splits)
+            html.Div(id="player-hands-container"),
+            # Bet Amount
+            dbc.InputGroup(
+                [
+                    dbc.InputGroupText("Bet Amount"),
+                    dbc.Input(
+                        id="blackjack-bet-amount",
+                        type="number",
+                        value=10,
+                        min=1,
+                        step=1,
+                    ),
+                ],
+                className="mb-3",
+            ),
+            # Game Controls
+            dbc.Row(
+                [
+                    dbc.Col(
+                        [
+                            dbc.Button(
+                                "Deal",
+                                id="deal-button",
+                                color="success",
+                                size="lg",
+                                className="w-100 mb-2",
+                            ),
+                            dbc.Button(
+                                "Hit",
+                                id="hit-button",
+                                color="warning",
+                                size="lg",
+                                className="w-100 mb-2",
+                                disabled=True,
+                            ),
+                            dbc.Button(
+                                "Stand",
+                                id="stand-button",
+                                color="danger",
+                                size="lg",
+                                className="w-100 mb-2",
+                                disabled=True,
+                            ),
+                            dbc.Button(
+                                "Double Down",
+                                id="double-button",
+                                color="info",
+                                size="lg",
+                                className="w-100 mb-2",
+                                disabled=True,
+                            ),
+                            dbc.Button(
+                                "Split",
+                                id="split-button",
+                                color="primary",
+                                size="lg",
+                                className="w-100 mb-2",
+                                disabled=True,
+                            ),
+                        ],
+                        width=12,
+                    )
+                ]
+            ),
+            # Game Status
+            html.Div(id="blackjack-status", className="mt-3 text-center fs-5"),
+            # Game Result
+            html.Div(
+                id="blackjack-result-message",
+                className="mt-3 text-center fs-4 fw-bold",
+            ),
+        ]
+    )
+)
+
+
+def render_blackjack_tab(user_id):
+    """Renders the layout for the blackjack game."""
+    return BLACKJACK_TAB_LAYOUT
+
+
+# Every play_blackjack output but the toast, for the early returns that only
+# report a problem
+NO_UPDATES_12 = (no_update,) * 12
+
+
 @app.callback(
     Output("blackjack-game-state", "data"),
     Output("player-hands-container", "children"),
@@ -1044,33 +1347,43 @@ def play_blackjack(
     double_clicks,
     split_clicks,
     game_state,
-    user_id,
+    session,
     bet_amount,
 ):
     """Handles the blackjack game logic with support for splitting and doubling."""
-    import json
+    user_id = session["id"]
 
     ctx = dash.callback_context
     if not ctx.triggered:
-        return (
-            no_update,
-            no_update,
-            no_update,
-            no_update,
-            no_update,
-            no_update,
-            no_update,
-            no_update,
-            no_update,
-            no_update,
-            no_update,
-            no_update,
-            no_update,
-        )
-
-    button_id = ctx.triggered[0]["prop_id"].split(".")[0]
+        return (*NO_UPDATES_12, no_update)
 
-    new_game_state = game_state.copy()
+    # Every statement for one button press runs in a single transaction
+    try:
+        with db_cursor() as cur:
+            outputs, audit_writes = blackjack_action(
+                cur, ctx.triggered_id, game_state, user_id, bet_amount
+            )
+    except RoundNotActive:
+        # Replayed or stale game state; anything the action wrote is rolled back
+        toast = error_toast("This round is no longer active.", "Round Over")
+        return (*NO_UPDATES_12, toast)
+
+    # Only log what the transaction above actually committed
+    for sql, params in audit_writes:
+        queue_audit_write(sql, params)
+    return outputs
+
+
+def blackjack_action(cur, button_id, game_state, user_id, bet_amount):
+    """Applies one blackjack button press.
+
+    All writes go through `cur`, so they commit or roll back together. Returns
+    the callback outputs and the (sql, params) audit writes to queue once that
+    transaction has committed.
+    """
+    # The state dict arrives fresh from JSON on every call, so it is updated in
+    # place; only a new deal builds a new one
+    new_game_state = game_state
     player_hands_display = ""
     dealer_display = ""
     dealer_score_text = ""
@@ -1083,116 +1396,86 @@ def play_blackjack(
     result_message = ""
     new_token_balance = no_update
     toast = no_update
+    audit_writes = []
 
     if button_id == "deal-button":
         if not bet_amount or bet_amount <= 0:
-            toast = dbc.Toast(
-                "Bet amount must be greater than 0.",
-                header="Invalid Bet",
-                icon="danger",
-                duration=4000,
-            )
-            return (
-                no_update,
-                no_update,
-                no_update,
-                no_update,
-                no_update,
-                no_update,
-                no_update,
-                no_update,
-                no_update,
-                no_update,
-                no_update,
-                no_update,
-                toast,
-            )
+            toast = error_toast("Bet amount must be greater than 0.", "Invalid Bet")
+            return (*NO_UPDATES_12, toast), []
 
-        user = get_user(user_id)
-        if user["tokens"] < bet_amount:
-            toast = dbc.Toast(
-                "Not enough tokens for this bet.",
-                header="Insufficient Funds",
-                icon="warning",
-                duration=4000,
-            )
-            return (
-                no_update,
-                no_update,
-                no_update,
-                no_update,
-                no_update,
-                no_update,
-                no_update,
-                no_update,
-                no_update,
-                no_update,
-                no_update,
-                no_update,
-                toast,
-            )
-
-        with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-            cur.execute(
-                "UPDATE users SET tokens = tokens - %s WHERE id = %s RETURNING tokens;",
-                (bet_amount, user_id),
-            )
-            new_token_balance = cur.fetchone()["tokens"]
-
-            cur.execute(
-                "INSERT INTO blackjack_rounds (user_id, initial_bet_amount, dealer_hand, dealer_score, round_status) VALUES (%s, %s, %s, %s, %s) RETURNING id;",
-                (user_id, bet_amount, "[]", 0, "active"),
-            )
-            round_id = cur.fetchone()["id"]
-            conn.commit()
-
-        deck = create_deck()
-        random.shuffle(deck)
+        deck_seed = secrets.randbits(63)
+        deck = shuffled_deck(deck_seed)
 
         player_hand = [deck.pop(), deck.pop()]
         dealer_hand = [deck.pop(), deck.pop()]
 
+        # Take the bet, open the round and record the first hand in a single
+        # round-trip. The balance check is part of the UPDATE, and the inserts
+        # only happen if it matched.
         hand_score = calculate_hand_value(player_hand)
-        with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-            cur.execute(
-                "INSERT INTO blackjack_hands (round_id, hand_number, bet_amount, cards, hand_score, hand_status) VALUES (%s, %s, %s, %s, %s, %s);",
-                (
-                    round_id,
-                    1,
-                    bet_amount,
-                    json.dumps(player_hand),
-                    hand_score,
-                    "active",
-                ),
+        cur.execute(
+            """
+            WITH u AS (
+                UPDATE users SET tokens = tokens - %s
+                WHERE id = %s AND tokens >= %s
+                RETURNING tokens
+            ), r AS (
+                INSERT INTO blackjack_rounds
+                (user_id, initial_bet_amount, deck_seed, drawn, dealer_hand,
+                 dealer_score, round_status)
+                SELECT %s, %s, %s, %s, %s, 0, 'active' FROM u
+                RETURNING id
+            ), h AS (
+                INSERT INTO blackjack_hands
+                (round_id, hand_number, bet_amount, cards, hand_score, hand_status)
+                SELECT id, 1, %s, %s, %s, 'active' FROM r
             )
-            conn.commit()
+            SELECT u.tokens, r.id AS round_id FROM u, r;
+            """,
+            (
+                bet_amount,
+                user_id,
+                bet_amount,
+                user_id,
+                bet_amount,
+                deck_seed,
+                len(DECK) - len(deck),
+                json.dumps(dealer_hand),
+                bet_amount,
+                json.dumps(player_hand),
+                hand_score,
+            ),
+        )
+        row = cur.fetchone()
+        if row is None:
+            toast = warning_toast(
+                "Not enough tokens for this bet.", "Insufficient Funds"
+            )
+            return (*NO_UPDATES_12, toast), []
+        new_token_balance = row["tokens"]
+        round_id = row["round_id"]
 
         new_game_state = {
-            "deck": deck,
-            "dealer_hand": dealer_hand,
-            "hands": [
-                {
-                    "cards": player_hand,
-                    "bet_amount": bet_amount,
-                    "status": "active",
-                    "is_doubled": False,
-                }
-            ],
+            # The hole card stays in blackjack_rounds
+            "dealer_upcard": dealer_hand[0],
+            "hands": new_hands(),
             "current_hand": 0,
             "round_id": round_id,
+            # Shown while the hole card is hidden; fixed for the whole round
+            "upcard_score": calculate_hand_value(dealer_hand[:1]),
             "game_active": True,
             "dealer_turn": False,
             "initial_bet": bet_amount,
         }
+        add_hand(new_game_state["hands"], player_hand, bet_amount, hand_score)
 
-        player_score = calculate_hand_value(player_hand)
         dealer_score = calculate_hand_value(dealer_hand)
 
         dealer_display = f"{format_card(dealer_hand[0])} ??"
-        dealer_score_text = f"Score: {calculate_hand_value([dealer_hand[0]])}"
+        dealer_score_text = f"Score: {new_game_state['upcard_score']}"
 
-        if player_score == 21:
-            dealer_display = format_hand(dealer_hand)
+        if hand_score == 21:
+            dealer_display = format_hand(tuple(dealer_hand))
             dealer_score_text = f"Score: {dealer_score}"
 
             if dealer_score == 21:
@@ -1204,24 +1487,25 @@ def play_blackjack(
                 payout = int(bet_amount * 2.5)
                 game_result = "blackjack"
 
-            with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-                cur.execute(
-                    "UPDATE users SET tokens = tokens + %s WHERE id = %s RETURNING tokens;",
-                    (payout, user_id),
-                )
-                new_token_balance = cur.fetchone()["tokens"]
+            cur.execute(
+                "UPDATE users SET tokens = tokens + %s WHERE id = %s RETURNING tokens;",
+                (payout, user_id),
+            )
+            new_token_balance = cur.fetchone()["tokens"]
 
-                cur.execute(
-                    "UPDATE blackjack_rounds SET dealer_hand = %s, dealer_score = %s, round_status = 'completed', total_payout = %s, completed_at = CURRENT_TIMESTAMP WHERE id = %s;",
-                    (json.dumps(dealer_hand), dealer_score, payout, round_id),
-                )
+            cur.execute(
+                "UPDATE blackjack_rounds SET dealer_score = %s, round_status = 'completed', total_payout = %s, completed_at = CURRENT_TIMESTAMP WHERE id = %s;",
+                (dealer_score, payout, round_id),
+            )
 
-                cur.execute(
-                    "UPDATE blackjack_hands SET hand_status = %s, hand_result = %s, payout_amount = %s WHERE round_id = %s AND hand_number = 1;",
-                    ("blackjack", game_result, payout, round_id),
-                )
+            cur.execute(
+                "UPDATE blackjack_hands SET hand_status = %s, hand_result = %s, payout_amount = %s WHERE round_id = %s AND hand_number = 1;",
+                ("blackjack", game_result, payout, round_id),
+            )
 
-                cur.execute(
+            # The transaction log isn't needed to answer the player
+            audit_writes.append(
+                (
                     "INSERT INTO transactions (user_id, transaction_type, amount, description) VALUES (%s, %s, %s, %s);",
                     (
                         user_id,
@@ -1230,7 +1514,7 @@ def play_blackjack(
                         result_message,
                     ),
                 )
-                conn.commit()
+            )
 
             new_game_state["game_active"] = False
             deal_disabled = False
@@ -1239,95 +1523,74 @@ def play_blackjack(
             hit_disabled = False
             stand_disabled = False
 
-            current_hand = new_game_state["hands"][0]
-            if can_split_hand(current_hand["cards"]) and user["tokens"] >= bet_amount:
+            # Splitting or doubling stakes the bet again on top of the one taken
+            can_afford = new_token_balance >= bet_amount
+            if can_split_hand(player_hand) and can_afford:
                 split_disabled = False
-            if can_double_down(current_hand["cards"]) and user["tokens"] >= bet_amount:
+            if can_double_down(player_hand) and can_afford:
                 double_disabled = False
 
             status_message = "Your turn - choose an action"
 
     elif button_id in ["hit-button", "double-button"] and game_state.get("game_active"):
         current_hand_idx = game_state["current_hand"]
-        current_hand = game_state["hands"][current_hand_idx].copy()
-        deck = game_state["deck"]
+        hands = game_state["hands"]
+        cards = hands["cards"][current_hand_idx]
 
         is_double = button_id == "double-button"
 
         if is_double:
-            user = get_user(user_id)
-            if user["tokens"] < current_hand["bet_amount"]:
-                toast = dbc.Toast(
-                    "Not enough tokens to double down.",
-                    header="Insufficient Funds",
-                    icon="warning",
-                    duration=4000,
-                )
-                return (
-                    no_update,
-                    no_update,
-                    no_update,
-                    no_update,
-                    no_update,
-                    no_update,
-                    no_update,
-                    no_update,
-                    no_update,
-                    no_update,
-                    no_update,
-                    no_update,
-                    toast,
-                )
-
-            with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-                cur.execute(
-                    "UPDATE users SET tokens = tokens - %s WHERE id = %s RETURNING tokens;",
-                    (current_hand["bet_amount"], user_id),
+            bet = hands["bet"][current_hand_idx]
+            # The balance check is part of the UPDATE, so no separate read
+            cur.execute(
+                "UPDATE users SET tokens = tokens - %s WHERE id = %s AND tokens >= %s RETURNING tokens;",
+                (bet, user_id, bet),
+            )
+            row = cur.fetchone()
+            if row is None:
+                toast = warning_toast(
+                    "Not enough tokens to double down.", "Insufficient Funds"
                 )
-                new_token_balance = cur.fetchone()["tokens"]
-                conn.commit()
+                return (*NO_UPDATES_12, toast), []
+            new_token_balance = row["tokens"]
 
-            current_hand["bet_amount"] *= 2
-            current_hand["is_doubled"] = True
+            hands["bet"][current_hand_idx] = bet * 2
+            hands["doubled"][current_hand_idx] = True
 
-        current_hand["cards"].append(deck.pop())
-        hand_score = calculate_hand_value(current_hand["cards"])
+        cards.extend(draw_round_cards(cur, game_state["round_id"], user_id, 1))
+        hand_score = calculate_hand_value(cards)
+        hands["score"][current_hand_idx] = hand_score
 
         if hand_score > 21:
-            current_hand["status"] = "bust"
+            hands["status"][current_hand_idx] = "bust"
         elif is_double:
-            current_hand["status"] = "stand"
-
-        new_game_state = game_state.copy()
-        new_game_state["deck"] = deck
-        new_game_state["hands"][current_hand_idx] = current_hand
+            hands["status"][current_hand_idx] = "stand"
 
-        with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-            cur.execute(
-                "UPDATE blackjack_hands SET cards = %s, hand_score = %s, hand_status = %s, bet_amount = %s, is_doubled = %s WHERE round_id = %s AND hand_number = %s;",
-                (
-                    json.dumps(current_hand["cards"]),
-                    hand_score,
-                    current_hand["status"],
-                    current_hand["bet_amount"],
-                    current_hand["is_doubled"],
-                    game_state["round_id"],
-                    current_hand_idx + 1,
-                ),
-            )
-            conn.commit()
+        cur.execute(
+            "UPDATE blackjack_hands SET cards = %s, hand_score = %s, hand_status = %s, bet_amount = %s, is_doubled = %s WHERE round_id = %s AND hand_number = %s;",
+            (
+                json.dumps(cards),
+                hand_score,
+                hands["status"][current_hand_idx],
+                hands["bet"][current_hand_idx],
+                hands["doubled"][current_hand_idx],
+                game_state["round_id"],
+                current_hand_idx + 1,
+            ),
+        )
 
-        if current_hand["status"] in ["bust", "stand"]:
+        if hands["status"][current_hand_idx] in ["bust", "stand"]:
             next_hand_idx = current_hand_idx + 1
-            if next_hand_idx < len(new_game_state["hands"]):
+            if next_hand_idx < len(hands["cards"]):
                 new_game_state["current_hand"] = next_hand_idx
-                next_hand = new_game_state["hands"][next_hand_idx]
-                if next_hand["status"] == "active":
+                if hands["status"][next_hand_idx] == "active":
                     hit_disabled = False
                     stand_disabled = False
-                    if can_double_down(next_hand["cards"]):
-                        user = get_user(user_id)
-                        if user["tokens"] >= next_hand["bet_amount"]:
+                    if can_double_down(hands["cards"][next_hand_idx]):
+                        # Reuse the balance from a double down if there was one
+                        if new_token_balance is no_update:
+                            new_token_balance = get_user_tokens(cur, user_id)
+                        if new_token_balance >= hands["bet"][next_hand_idx]:
                             double_disabled = False
                     status_message = f"Playing hand {next_hand_idx + 1}"
             else:
@@ -1340,206 +1603,205 @@ def play_blackjack(
             split_disabled = True
             status_message = f"Playing hand {current_hand_idx + 1}"
 
-        dealer_display = f"{format_card(game_state['dealer_hand'][0])} ??"
-        dealer_score_text = (
-            f"Score: {calculate_hand_value([game_state['dealer_hand'][0]])}"
-        )
+        dealer_display = f"{format_card(game_state['dealer_upcard'])} ??"
+        dealer_score_text = f"Score: {game_state['upcard_score']}"
 
     elif button_id == "split-button" and game_state.get("game_active"):
         current_hand_idx = game_state["current_hand"]
-        current_hand = game_state["hands"][current_hand_idx].copy()
-
-        user = get_user(user_id)
-        if user["tokens"] < current_hand["bet_amount"]:
-            toast = dbc.Toast(
-                "Not enough tokens to split.",
-                header="Insufficient Funds",
-                icon="warning",
-                duration=4000,
-            )
-            return (
-                no_update,
-                no_update,
-                no_update,
-                no_update,
-                no_update,
-                no_update,
-                no_update,
-                no_update,
-                no_update,
-                no_update,
-                no_update,
-                no_update,
-                toast,
-            )
+        hands = game_state["hands"]
+        bet = hands["bet"][current_hand_idx]
 
-        with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-            cur.execute(
-                "UPDATE users SET tokens = tokens - %s WHERE id = %s RETURNING tokens;",
-                (current_hand["bet_amount"], user_id),
-            )
-            new_token_balance = cur.fetchone()["tokens"]
-            conn.commit()
+        deck, _ = load_round_deck(cur, game_state["round_id"], user_id)
 
-        deck = game_state["deck"]
+        first_card, second_card = hands["cards"][current_hand_idx]
 
-        first_card = current_hand["cards"][0]
-        second_card = current_hand["cards"][1]
+        cards = [first_card, deck.pop()]
+        hands["cards"][current_hand_idx] = cards
+        hands["status"][current_hand_idx] = "active"
+        hands["score"][current_hand_idx] = calculate_hand_value(cards)
 
-        current_hand["cards"] = [first_card, deck.pop()]
-        current_hand["status"] = "active"
+        second_hand = [second_card, deck.pop()]
+        add_hand(hands, second_hand, bet, calculate_hand_value(second_hand))
+        new_hand_idx = len(hands["cards"]) - 1
 
-        second_hand = {
-            "cards": [second_card, deck.pop()],
-            "bet_amount": current_hand["bet_amount"],
-            "status": "active",
-            "is_doubled": False,
-        }
-
-        new_game_state = game_state.copy()
-        new_game_state["deck"] = deck
-        new_game_state["hands"][current_hand_idx] = current_hand
-        new_game_state["hands"].append(second_hand)
-
-        with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-            hand_score = calculate_hand_value(current_hand["cards"])
-            cur.execute(
-                "UPDATE blackjack_hands SET cards = %s, hand_score = %s WHERE round_id = %s AND hand_number = %s;",
-                (
-                    json.dumps(current_hand["cards"]),
-                    hand_score,
-                    game_state["round_id"],
-                    current_hand_idx + 1,
-                ),
-            )
-
-            hand_score = calculate_hand_value(second_hand["cards"])
-            cur.execute(
-                "INSERT INTO blackjack_hands (round_id, hand_number, bet_amount, cards, hand_score, hand_status) VALUES (%s, %s, %s, %s, %s, %s);",
-                (
-                    game_state["round_id"],
-                    len(new_game_state["hands"]),
-                    second_hand["bet_amount"],
-                    json.dumps(second_hand["cards"]),
-                    hand_score,
-                    "active",
-                ),
+        # Take the second bet, redeal the split hand, add the new one and
+        # advance the deck in a single round-trip; nothing is written unless
+        # the balance covers it
+        cur.execute(
+            """
+            WITH u AS (
+                UPDATE users SET tokens = tokens - %s
+                WHERE id = %s AND tokens >= %s
+                RETURNING tokens
+            ), rnd AS (
+                UPDATE blackjack_rounds SET drawn = drawn + 2
+                WHERE id = %s AND EXISTS (SELECT 1 FROM u)
+            ), split AS (
+                UPDATE blackjack_hands SET cards = %s, hand_score = %s
+                WHERE round_id = %s AND hand_number = %s AND EXISTS (SELECT 1 FROM u)
+            ), h AS (
+                INSERT INTO blackjack_hands
+                (round_id, hand_number, bet_amount, cards, hand_score, hand_status)
+                SELECT %s, %s, %s, %s, %s, 'active' FROM u
             )
-            conn.commit()
+            SELECT tokens FROM u;
+            """,
+            (
+                bet,
+                user_id,
+                bet,
+                game_state["round_id"],
+                json.dumps(cards),
+                hands["score"][current_hand_idx],
+                game_state["round_id"],
+                current_hand_idx + 1,
+                game_state["round_id"],
+                new_hand_idx + 1,
+                bet,
+                json.dumps(hands["cards"][new_hand_idx]),
+                hands["score"][new_hand_idx],
+            ),
+        )
+        row = cur.fetchone()
+        if row is None:
+            toast = warning_toast("Not enough tokens to split.", "Insufficient Funds")
+            return (*NO_UPDATES_12, toast), []
+        new_token_balance = row["tokens"]
 
         hit_disabled = False
         stand_disabled = False
-        if can_double_down(current_hand["cards"]):
-            user = get_user(user_id)
-            if user["tokens"] >= current_hand["bet_amount"]:
+        if can_double_down(cards):
+            if new_token_balance >= bet:
                 double_disabled = False
         split_disabled = True
-        status_message = f"Playing hand 1 of {len(new_game_state['hands'])}"
+        status_message = f"Playing hand 1 of {len(hands['cards'])}"
 
-        dealer_display = f"{format_card(game_state['dealer_hand'][0])} ??"
-        dealer_score_text = (
-            f"Score: {calculate_hand_value([game_state['dealer_hand'][0]])}"
-        )
+        dealer_display = f"{format_card(game_state['dealer_upcard'])} ??"
+        dealer_score_text = f"Score: {game_state['upcard_score']}"
 
     elif button_id == "stand-button" and game_state.get("game_active"):
         current_hand_idx = game_state["current_hand"]
-        current_hand = game_state["hands"][current_hand_idx].copy()
-        current_hand["status"] = "stand"
-
-        new_game_state = game_state.copy()
-        new_game_state["hands"][current_hand_idx] = current_hand
+        hands = game_state["hands"]
+        hands["status"][current_hand_idx] = "stand"
 
-        with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
+        next_hand_idx = current_hand_idx + 1
+        if next_hand_idx < len(hands["cards"]):
             cur.execute(
                 "UPDATE blackjack_hands SET hand_status = 'stand' WHERE round_id = %s AND hand_number = %s;",
                 (game_state["round_id"], current_hand_idx + 1),
             )
-            conn.commit()
-
-        next_hand_idx = current_hand_idx + 1
-        if next_hand_idx < len(new_game_state["hands"]):
             new_game_state["current_hand"] = next_hand_idx
-            next_hand = new_game_state["hands"][next_hand_idx]
-            if next_hand["status"] == "active":
+            if hands["status"][next_hand_idx] == "active":
                 hit_disabled = False
                 stand_disabled = False
-                if can_double_down(next_hand["cards"]):
-                    user = get_user(user_id)
-                    if user["tokens"] >= next_hand["bet_amount"]:
+                if can_double_down(hands["cards"][next_hand_idx]):
+                    new_token_balance = get_user_tokens(cur, user_id)
+                    if new_token_balance >= hands["bet"][next_hand_idx]:
                         double_disabled = False
                 status_message = f"Playing hand {next_hand_idx + 1}"
         else:
             new_game_state["dealer_turn"] = True
             status_message = "Dealer's turn"
 
-        dealer_display = f"{format_card(game_state['dealer_hand'][0])} ??"
-        dealer_score_text = (
-            f"Score: {calculate_hand_value([game_state['dealer_hand'][0]])}"
-        )
+        dealer_display = f"{format_card(game_state['dealer_upcard'])} ??"
+        dealer_score_text = f"Score: {game_state['upcard_score']}"
 
     if new_game_state.get("dealer_turn") and new_game_state.get("game_active"):
-        dealer_hand = new_game_state["dealer_hand"].copy()
-        deck = new_game_state["deck"]
-        dealer_score = calculate_hand_value(dealer_hand)
+        deck, dealer_hand = load_round_deck(cur, new_game_state["round_id"], user_id)
+        deck_size = len(deck)
+        # Keep a running hard total so each hit only adds the new card's value
+        hard_value = sum(CARD_VALUE[card] for card in dealer_hand)
+        has_ace = any(CARD_VALUE[card] == 1 for card in dealer_hand)
+        dealer_score = soft_value(hard_value, has_ace)
 
         while dealer_score < 17:
-            dealer_hand.append(deck.pop())
-            dealer_score = calculate_hand_value(dealer_hand)
-
-        new_game_state["dealer_hand"] = dealer_hand
+            card = deck.pop()
+            dealer_hand.append(card)
+            hard_value += CARD_VALUE[card]
+            has_ace = has_ace or CARD_VALUE[card] == 1
+            dealer_score = soft_value(hard_value, has_ace)
 
         total_payout = 0
         results = []
-
-        for i, hand in enumerate(new_game_state["hands"]):
-            hand_score = calculate_hand_value(hand["cards"])
-
-            if hand["status"] == "bust":
+        hand_results = []
+        hand_payouts = []
+
+        hands = new_game_state["hands"]
+        for i, (status, bet, hand_score) in enumerate(
+            zip(hands["status"], hands["bet"], hands["score"])
+        ):
+            if status == "bust":
                 result = "lose"
                 payout = 0
             elif dealer_score > 21:
                 result = "win"
-                payout = hand["bet_amount"] * 2
+                payout = bet * 2
             elif hand_score > dealer_score:
                 result = "win"
-                payout = hand["bet_amount"] * 2
+                payout = bet * 2
             elif dealer_score > hand_score:
                 result = "lose"
                 payout = 0
             else:
                 result = "push"
-                payout = hand["bet_amount"]
+                payout = bet
 
             total_payout += payout
             results.append(f"Hand {i+1}: {result.title()} (${payout})")
-
-            with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-                cur.execute(
-                    "UPDATE blackjack_hands SET hand_result = %s, payout_amount = %s WHERE round_id = %s AND hand_number = %s;",
-                    (result, payout, new_game_state["round_id"], i + 1),
-                )
-
-        with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-            cur.execute(
-                "UPDATE users SET tokens = tokens + %s WHERE id = %s RETURNING tokens;",
-                (total_payout, user_id),
-            )
-            new_token_balance = cur.fetchone()["tokens"]
-
-            cur.execute(
-                "UPDATE blackjack_rounds SET dealer_hand = %s, dealer_score = %s, round_status = 'completed', total_payout = %s, completed_at = CURRENT_TIMESTAMP WHERE id = %s;",
-                (
-                    json.dumps(dealer_hand),
-                    dealer_score,
-                    total_payout,
-                    new_game_state["round_id"],
-                ),
+            hand_results.append(result)
+            hand_payouts.append(payout)
+
+        net_change = total_payout - sum(hands["bet"])
+        # Settle every hand, close the round and pay out in a single round-trip.
+        # The per-hand results travel as parallel arrays and are joined back to
+        # their rows by hand number. The statuses include a stand that ended
+        # the round, which is written here rather than in a separate UPDATE.
+        # Nothing is settled or paid unless the round was still active.
+        cur.execute(
+            """
+            WITH rnd AS (
+                UPDATE blackjack_rounds
+                SET dealer_hand = %s, dealer_score = %s, round_status = 'completed',
+                    total_payout = %s, drawn = drawn + %s,
+                    completed_at = CURRENT_TIMESTAMP
+                WHERE id = %s AND user_id = %s AND round_status = 'active'
+                RETURNING id
+            ), hands AS (
+                UPDATE blackjack_hands AS h
+                SET hand_status = v.status, hand_result = v.result,
+                    payout_amount = v.payout
+                FROM unnest(%s::text[], %s::text[], %s::int[]) WITH ORDINALITY
+                    AS v(status, result, payout, hand_number)
+                WHERE h.round_id = %s AND h.hand_number = v.hand_number
+                    AND EXISTS (SELECT 1 FROM rnd)
             )
+            UPDATE users SET tokens = tokens + %s
+            WHERE id = %s AND EXISTS (SELECT 1 FROM rnd)
+            RETURNING tokens;
+            """,
+            (
+                json.dumps(dealer_hand),
+                dealer_score,
+                total_payout,
+                deck_size - len(deck),
+                new_game_state["round_id"],
+                user_id,
+                hands["status"],
+                hand_results,
+                hand_payouts,
+                new_game_state["round_id"],
+                total_payout,
+                user_id,
+            ),
+        )
+        row = cur.fetchone()
+        if row is None:
+            # Already settled, e.g. a replayed stand; nothing was paid out
+            raise RoundNotActive(new_game_state["round_id"])
+        new_token_balance = row["tokens"]
 
-            net_change = total_payout - sum(
-                hand["bet_amount"] for hand in new_game_state["hands"]
-            )
-            cur.execute(
+        audit_writes.append(
+            (
                 "INSERT INTO transactions (user_id, transaction_type, amount, description) VALUES (%s, %s, %s, %s);",
                 (
                     user_id,
@@ -1548,7 +1810,7 @@ def play_blackjack(
                     f"Blackjack round completed: {'; '.join(results)}",
                 ),
             )
-            conn.commit()
+        )
 
         new_game_state["game_active"] = False
         deal_disabled = False
@@ -1557,48 +1819,35 @@ def play_blackjack(
         double_disabled = True
         split_disabled = True
 
-        dealer_display = format_hand(dealer_hand)
+        dealer_display = format_hand(tuple(dealer_hand))
         dealer_score_text = f"Score: {dealer_score}"
         result_message = f"Round Complete! Total payout: {total_payout} tokens"
         status_message = "; ".join(results)
 
-    if new_game_state.get("hands"):
-        hands_components = []
-        for i, hand in enumerate(new_game_state["hands"]):
-            is_current = i == new_game_state.get("current_hand", 0)
-            hand_score = calculate_hand_value(hand["cards"])
-
-            border_class = (
-                "border-warning border-3"
-                if is_current and new_game_state.get("game_active")
-                else "border"
+    hands = new_game_state.get("hands")
+    if hands and hands["cards"]:
+        game_active = new_game_state.get("game_active")
+        current_hand_idx = new_game_state.get("current_hand", 0)
+        hands_components = [
+            render_hand(
+                i + 1,
+                format_hand(tuple(cards)),
+                bet,
+                status,
+                is_doubled,
+                score,
+                bool(game_active and i == current_hand_idx),
             )
-
-            hand_component = dbc.Row(
-                [
-                    dbc.Col(
-                        [
-                            html.H6(
-                                f"Hand {i+1} {'(Current)' if is_current and new_game_state.get('game_active') else ''} - Bet: {hand['bet_amount']} {'(Doubled)' if hand.get('is_doubled') else ''}",
-                                className="text-center mb-2",
-                            ),
-                            html.Div(
-                                format_hand(hand["cards"]),
-                                className=f"fs-5 text-center p-2 rounded bg-light text-dark {border_class}",
-                            ),
-                            html.Div(
-                                f"Score: {hand_score} ({hand['status'].title()})",
-                                className="text-center fw-bold mt-1",
-                            ),
-                        ],
-                        width=12,
-                    )
-                ],
-                className="mb-3",
+            for i, (cards, bet, status, is_doubled, score) in enumerate(
+                zip(
+                    hands["cards"],
+                    hands["bet"],
+                    hands["status"],
+                    hands["doubled"],
+                    hands["score"],
+                )
             )
-
-            hands_components.append(hand_component)
-
+        ]
         player_hands_display = html.Div(hands_components)
 
     return (
@@ -1615,13 +1864,35 @@ def play_blackjack(
         result_message,
         new_token_balance,
         toast,
-    )
+    ), audit_writes
 
 
 # --- Food Station Tab ---
+@functools.lru_cache(maxsize=8)
+def build_menu_rows(menu_items):
+    """Builds the food menu table rows; cached per (immutable) menu."""
+    return tuple(
+        html.Tr(
+            [
+                html.Td(item.name),
+                html.Td(item.description),
+                html.Td(item.price),
+                html.Td(
+                    dbc.Button(
+                        "Buy",
+                        id={"type": "buy-food-btn", "item_id": item.id},
+                        color="info",
+                        size="sm",
+                    )
+                ),
+            ]
+        )
+        for item in menu_items
+    )
+
+
 def render_food_tab(user_id):
     """Renders the layout for the food station."""
-    menu_items = get_food_menu()
     menu_table = dbc.Table(
         # Header
         [
@@ -1638,28 +1909,7 @@ def render_food_tab(user_id):
         ]
         +
         # Body
-        [
-            html.Tbody(
-                [
-                    html.Tr(
-                        [
-                            html.Td(item["name"]),
-                            html.Td(item["description"]),
-                            html.Td(item["price"]),
-                            html.Td(
-                                dbc.Button(
-                                    "Buy",
-                                    id={"type": "buy-food-btn", "item_id": item["id"]},
-                                    color="info",
-                                    size="sm",
-                                )
-                            ),
-                        ]
-                    )
-                    for item in menu_items
-                ]
-            )
-        ],
+        [html.Tbody(list(build_menu_rows(get_food_menu())))],
         bordered=True,
         striped=True,
         hover=True,
@@ -1687,89 +1937,82 @@ def render_food_tab(user_id):
     State("user-session", "data"),
     prevent_initial_call=True,
 )
-def buy_food(n_clicks, user_id):
+def buy_food(n_clicks, session):
     """Handles the logic for purchasing a food item."""
+    user_id = session["id"]
     ctx = dash.callback_context
 
     if not ctx.triggered or not any(click for click in n_clicks if click is not None):
         return no_update, no_update
 
-    button_id = ctx.triggered[0]["prop_id"].split(".")[0]
-    item_id = eval(button_id)["item_id"]
+    item_id = ctx.triggered_id["item_id"]
 
-    with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-        # Get item price and user tokens
-        cur.execute("SELECT price, name FROM food_menu WHERE id = %s;", (item_id,))
+    with db_cursor() as cur:
+        # Look up the item, debit the user and log the purchase in a single
+        # round-trip. The debit (and both logs) only happen if the user can
+        # afford the item, in which case new_balance is non-NULL.
+        cur.execute(
+            """
+            WITH item AS (
+                SELECT id, name, price FROM food_menu WHERE id = %s
+            ), upd AS (
+                UPDATE users SET tokens = tokens - (SELECT price FROM item)
+                WHERE id = %s AND tokens >= (SELECT price FROM item)
+                RETURNING tokens
+            ), purchase AS (
+                INSERT INTO food_purchases (user_id, food_item_id, quantity, total_price)
+                SELECT %s, id, 1, price FROM item WHERE EXISTS (SELECT 1 FROM upd)
+            ), txn AS (
+                INSERT INTO transactions (user_id, transaction_type, amount, description)
+                SELECT %s, 'food_purchase', -price, 'Purchased ' || name || '.'
+                FROM item WHERE EXISTS (SELECT 1 FROM upd)
+            )
+            SELECT name, (SELECT tokens FROM upd) AS new_balance FROM item;
+            """,
+            (item_id, user_id, user_id, user_id),
+        )
         item = cur.fetchone()
-        cur.execute("SELECT tokens FROM users WHERE id = %s;", (user_id,))
-        user = cur.fetchone()
 
-        if not item or not user:
-            toast = dbc.Toast(
-                "An error occurred.", header="Error", icon="danger", duration=4000
-            )
-            return no_update, toast
-
-        if user["tokens"] < item["price"]:
-            toast = dbc.Toast(
-                f"Not enough tokens to buy {item['name']}.",
-                header="Insufficient Funds",
-                icon="warning",
-                duration=4000,
-            )
-            return no_update, toast
+    if not item:
+        toast = error_toast("An error occurred.", "Error")
+        return no_update, toast
 
-        # Perform transaction
-        token_change = -item["price"]
-        cur.execute(
-            "UPDATE users SET tokens = tokens + %s WHERE id = %s RETURNING tokens;",
-            (token_change, user_id),
+    if item["new_balance"] is None:
+        toast = warning_toast(
+            f"Not enough tokens to buy {item['name']}.", "Insufficient Funds"
         )
-        new_balance = cur.fetchone()["tokens"]
-        # Log food purchase
-        cur.execute(
-            "INSERT INTO food_purchases (user_id, food_item_id, quantity, total_price) VALUES (%s, %s, 1, %s);",
-            (user_id, item_id, item["price"]),
-        )
-        # Log generic transaction
-        cur.execute(
-            "INSERT INTO transactions (user_id, transaction_type, amount, description) VALUES (%s, %s, %s, %s);",
-            (user_id, "food_purchase", token_change, f"Purchased {item['name']}."),
-        )
-        conn.commit()
+        return no_update, toast
 
-    toast = dbc.Toast(
-        f"You purchased a {item['name']}! Enjoy!",
-        header="Order Up!",
-        icon="success",
-        duration=4000,
-    )
-    return new_balance, toast
+    toast = success_toast(f"You purchased a {item['name']}! Enjoy!", "Order Up!")
+    return item["new_balance"], toast
 
 
 # Transaction History
+HISTORY_TAB_LAYOUT = dbc.Container(
+    [
+        dbc.Card(
+            [
+                dbc.CardHeader(
+                    dbc.Button(
+                        "View Action History",
+                        id="toggle-history",
+                        color="secondary",
+                        className="w-100",
+                    )
+                ),
+                dbc.Collapse(
+                    dbc.CardBody(html.Div(id="history-log")),
+                    id="history-collapse",
+                    is_open=False,
+                ),
+            ]
+        )
+    ]
+)
+
+
 def render_history_tab(user_id):
-    return dbc.Container(
-        [
-            dbc.Card(
-                [
-                    dbc.CardHeader(
-                        dbc.Button(
-                            "View Action History",
-                            id="toggle-history",
-                            color="secondary",
-                            className="w-100",
-                        )
-                    ),
-                    dbc.Collapse(
-                        dbc.CardBody(html.Div(id="history-log")),
-                        id="history-collapse",
-                        is_open=False,
-                    ),
-                ]
-            )
-        ]
-    )
+    return HISTORY_TAB_LAYOUT
 
 
 @app.callback(
@@ -1788,14 +2031,15 @@ def toggle_history(n, is_open):
     State("user-session", "data"),
     prevent_initial_call=True,
 )
-def load_history(is_open, user_id):
+def load_history(is_open, session):
+    user_id = session["id"]
     if not is_open:
         return no_update
 
-    with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
+    with db_cursor() as cur:
         cur.execute(
             """
-            SELECT t.transaction_type, t.amount, t.description, t.created_at, c.card_number
+            SELECT t.transaction_type, t.amount, t.description, t.created_at, c.last4
             FROM transactions t
             LEFT JOIN credit_cards c ON t.card_id = c.id
             WHERE t.user_id = %s
@@ -1812,7 +2056,7 @@ def load_history(is_open, user_id):
     items = []
     for log in logs:
         card_display = (
-            f" (Card ending in {log['card_number'][-4:]})" if log["card_number"] else ""
+            f" (Card ending in {log['last4']})" if log["last4"] else ""
         )
         items.append(
             dbc.ListGroupItem(
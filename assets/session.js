@@ -0,0 +1,8 @@
+// Clientside callbacks for the login session.
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    session: {
+        mirror_balance: function (tokens) {
+            return tokens;
+        },
+    },
+});
@@ -0,0 +1,18 @@
+// Clientside callbacks for the slots tab.
+// The server decides every spin; these only draw the result it returns.
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    slots: {
+        render_spin: function (spin) {
+            if (!spin) {
+                throw window.dash_clientside.PreventUpdate;
+            }
+            return [
+                spin.reels[0],
+                spin.reels[1],
+                spin.reels[2],
+                spin.message,
+                {color: spin.color},
+            ];
+        },
+    },
+});
@@ -8,11 +8,13 @@ CREATE TABLE users (
 
 -- Create the credit_cards table.
 -- This table stores credit card information linked to a user.
+-- The full card number is never stored, only its last four digits (for
+-- display).
 -- The user_id is a foreign key referencing the users table.
 CREATE TABLE credit_cards (
     id SERIAL PRIMARY KEY,
     user_id INTEGER NOT NULL,
-    card_number VARCHAR(255) NOT NULL,
+    last4 CHAR(4) NOT NULL,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
 );
@@ -69,7 +71,9 @@ CREATE TABLE blackjack_rounds (
     id SERIAL PRIMARY KEY,
     user_id INTEGER NOT NULL,
     initial_bet_amount INTEGER NOT NULL,
-    dealer_hand TEXT NOT NULL, -- JSON string of dealer's cards
+    deck_seed BIGINT NOT NULL, -- Shuffles the round's deck; never sent to the client
+    drawn INTEGER NOT NULL DEFAULT 0, -- Cards dealt so far from the round's deck
+    dealer_hand TEXT NOT NULL, -- JSON array of dealer's cards (0-51, see app.py)
     dealer_score INTEGER NOT NULL,
     round_status VARCHAR(20) NOT NULL, -- 'active', 'completed'
     total_payout INTEGER DEFAULT 0,
@@ -84,7 +88,7 @@ CREATE TABLE blackjack_hands (
     round_id INTEGER NOT NULL,
     hand_number INTEGER NOT NULL, -- 1 for first hand, 2+ for split hands
     bet_amount INTEGER NOT NULL,
-    cards TEXT NOT NULL, -- JSON string of hand's cards
+    cards TEXT NOT NULL, -- JSON array of hand's cards (0-51, see app.py)
     hand_score INTEGER NOT NULL,
     hand_status VARCHAR(20) NOT NULL, -- 'active', 'stand', 'bust', 'blackjack', 'doubled'
     hand_result VARCHAR(20), -- 'win', 'lose', 'push', 'blackjack' (filled when round completes)
@@ -94,6 +98,15 @@ CREATE TABLE blackjack_hands (
     FOREIGN KEY (round_id) REFERENCES blackjack_rounds (id) ON DELETE CASCADE
 );
 
+-- Indexes supporting the application's lookups.
+-- The (email, username) index also serves as the conflict target for the
+-- login upsert.
+CREATE UNIQUE INDEX idx_users_email_username ON users (email, username);
+CREATE INDEX idx_credit_cards_user ON credit_cards (user_id);
+CREATE INDEX idx_transactions_user ON transactions (user_id);
+CREATE INDEX idx_food_purchases_user ON food_purchases (user_id);
+CREATE INDEX idx_slots_spins_user ON slots_spins (user_id);
+
 -- Insert some default items into the food menu for demonstration.
 INSERT INTO food_menu (name, description, price) VALUES
 ('Casino Burger', 'A juicy all-beef patty with our special sauce.', 15),
@@ -0,0 +1,9 @@
+-- init.sql only runs on an empty database volume. Apply this to a database
+-- created before credit_cards stored last4 instead of the full card number:
+--   psql -h localhost -U casino_user -d casino_db -f migrations/001_credit_cards_last4.sql
+BEGIN;
+ALTER TABLE credit_cards ADD COLUMN last4 CHAR(4);
+UPDATE credit_cards SET last4 = right(card_number, 4);
+ALTER TABLE credit_cards ALTER COLUMN last4 SET NOT NULL;
+ALTER TABLE credit_cards DROP COLUMN card_number;
+COMMIT;
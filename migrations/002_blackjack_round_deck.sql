@@ -0,0 +1,12 @@
+-- init.sql only runs on an empty database volume. Apply this to a database
+-- created before blackjack rounds kept their deck on the server:
+--   psql -h localhost -U casino_user -d casino_db -f migrations/002_blackjack_round_deck.sql
+-- Rounds still active from before have no seed and can't be resumed, so they
+-- are closed without a payout.
+BEGIN;
+ALTER TABLE blackjack_rounds ADD COLUMN deck_seed BIGINT NOT NULL DEFAULT 0;
+ALTER TABLE blackjack_rounds ALTER COLUMN deck_seed DROP DEFAULT;
+ALTER TABLE blackjack_rounds ADD COLUMN drawn INTEGER NOT NULL DEFAULT 0;
+UPDATE blackjack_rounds SET round_status = 'completed', completed_at = CURRENT_TIMESTAMP
+WHERE round_status = 'active';
+COMMIT;
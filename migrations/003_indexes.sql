@@ -0,0 +1,16 @@
+-- init.sql only runs on an empty database volume. Apply this to a database
+-- created before the lookup indexes were added:
+--   psql -h localhost -U casino_user -d casino_db -f migrations/003_indexes.sql
+-- The login upsert's ON CONFLICT (email, username) needs the unique index.
+-- Emails are already unique, so this only clears duplicates if that
+-- constraint was ever dropped; the oldest row for each pair is kept.
+BEGIN;
+DELETE FROM users AS u
+USING users AS keep
+WHERE u.email = keep.email AND u.username = keep.username AND u.id > keep.id;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_users_email_username ON users (email, username);
+CREATE INDEX IF NOT EXISTS idx_credit_cards_user ON credit_cards (user_id);
+CREATE INDEX IF NOT EXISTS idx_transactions_user ON transactions (user_id);
+CREATE INDEX IF NOT EXISTS idx_food_purchases_user ON food_purchases (user_id);
+CREATE INDEX IF NOT EXISTS idx_slots_spins_user ON slots_spins (user_id);
+COMMIT;